@@ -1,21 +1,46 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import sys
+import json
+import time
+import hashlib
 import subprocess
 import tempfile
-import argparse
+from pathlib import Path
 from textwrap import dedent
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 
-# requests is required for real API calls
+# requests is required for real API calls; it is slow to import, so it is
+# loaded on first use by _get_requests() instead of at startup.
+requests = None
+
+# orjson is optional; it only speeds up parsing of API responses
 try:
-    import requests
+    from orjson import loads as json_loads
 except ImportError:
-    requests = None
+    json_loads = json.loads
 
 VERSION = "1.0.0"
 DEBUG = False
+_SESSION = None  # shared requests.Session, created on first API call
+MODEL_PREFERENCE = ("sonnet", "opus", "haiku")
+MODELS_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Prompt size limits: keep uploads small and well within the context window.
+MAX_FILE_CHARS = 8 * 1024  # per newly added file, once the diff is too long
+MAX_DIFF_CHARS = 32 * 1024  # whole diff embedded in the prompt
+RECENT_COMMITS_MAX_DIFF = 64 * 1024  # skip git log above this diff size
+LOW_PRIORITY_SUFFIXES = (
+    ".lock",
+    "-lock.json",
+    "-lock.yaml",
+    ".min.js",
+    ".min.css",
+    ".map",
+    ".svg",
+)
 
 
 # ----------------------
@@ -27,67 +52,105 @@ def debug(msg: str) -> None:
         print(f"DEBUG: {msg}", file=sys.stderr)
 
 
-def run_cmd(cmd: List[str]) -> str:
-    """Run a shell command and return stdout (UTF-8 safe on Windows)."""
+def run_cmd(
+    cmd: List[str], binary: bool = False, spool: bool = False
+) -> Union[str, bytes]:
+    """Run a shell command and return stdout (UTF-8 safe on Windows).
+
+    With ``binary=True`` stdout is returned as raw bytes, skipping the decode
+    for callers that only split it or pass it along. ``spool=True`` sends
+    stdout to an unnamed temp file instead of a pipe, so large output is
+    written by the child directly and read back in one call.
+    """
     debug(f"run_cmd: {' '.join(cmd)}")
+    text_args: Dict[str, Any] = (
+        {} if binary else {"text": True, "encoding": "utf-8", "errors": "replace"}
+    )
     try:
-        completed = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding="utf-8",
-            errors="replace",
-        )
-        return completed.stdout or ""
+        if spool:
+            tmp_dir = os.getenv("XDG_RUNTIME_DIR") or None
+            with tempfile.TemporaryFile(dir=tmp_dir) as out:
+                subprocess.run(cmd, stdout=out, stderr=subprocess.PIPE, check=True)
+                out.seek(0)
+                data = out.read()
+            return data if binary else data.decode("utf-8", errors="replace")
+        completed = subprocess.run(cmd, capture_output=True, check=True, **text_args)
+        return completed.stdout or (b"" if binary else "")
     except subprocess.CalledProcessError as e:
-        raise SystemExit(f"Error running command {' '.join(cmd)}: {e.stderr or e}")
+        stderr = e.stderr
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode("utf-8", errors="replace")
+        raise SystemExit(f"Error running command {' '.join(cmd)}: {stderr or e}")
 
 
-def get_staged_diff() -> str:
-    """Return the current staged git diff."""
-    try:
-        return run_cmd(["git", "diff", "--cached"])
-    except SystemExit as e:
-        sys.exit(f"Error getting git diff: {e}")
+def get_staged_diff() -> bytes:
+    """Return the current staged git diff as bytes.
 
-
-def get_new_staged_files() -> List[str]:
-    """Return list of newly added staged files."""
+    New files are included in full as ``+`` lines; the diff is decoded once
+    when the prompt is built.
+    """
     try:
-        out = run_cmd(["git", "diff", "--cached", "--name-only", "--diff-filter=A"])
-        return out.split()
+        return run_cmd(["git", "diff", "--cached"], binary=True, spool=True)
     except SystemExit as e:
-        sys.exit(f"Error getting new staged files: {e}")
+        sys.exit(f"Error getting git diff: {e}")
 
 
 def get_recent_commits(n: int = 3) -> str:
-    """Return recent commit messages for context."""
+    """Return recent commit messages for context, separated by ``---``."""
     try:
-        return run_cmd(["git", "log", f"-{n}", "--pretty=format:%B"])
+        out = run_cmd(
+            [
+                "git",
+                "log",
+                f"-{n}",
+                "--format=%B%x00",
+                "--no-decorate",
+                "--no-show-signature",
+            ]
+        )
     except SystemExit:
         return ""
+    # Bodies are NUL-terminated, so commit boundaries are unambiguous.
+    bodies = [body.strip() for body in out.split("\x00")]
+    return "\n---\n".join(body for body in bodies if body)
 
 
-def append_new_files_to_diff(diff: str, new_files: List[str]) -> str:
-    """Append full content of new files to diff for better context."""
-    for file in new_files:
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                content = f.read()
-            diff += f"\n--- /dev/null\n+++ b/{file}\n{content}\n"
-        except Exception as e:
-            sys.exit(f"Error reading file {file}: {e}")
-    return diff
+def _head_exists() -> bool:
+    """Cheap probe for a fresh repository, without spawning git.
+
+    Returns False only when ``./.git/HEAD`` names a branch with no loose ref
+    and there is no packed-refs or reftable storage; otherwise True, and
+    git log answers as usual.
+    """
+    try:
+        with open(os.path.join(".git", "HEAD"), "r", encoding="utf-8") as f:
+            head = f.read().strip()
+    except OSError:
+        return True
+    if not head.startswith("ref: "):
+        return True
+    candidates = (head[len("ref: ") :], "packed-refs", "reftable")
+    return any(os.path.exists(os.path.join(".git", name)) for name in candidates)
+
+
+def get_recent_context(diff: bytes, n: int = 3) -> str:
+    """Return recent commits for the prompt, or "" when they would not help.
+
+    Recent commits are skipped when there are none yet, or when the diff is
+    so large that they would add little to the prompt.
+    """
+    if len(diff) > RECENT_COMMITS_MAX_DIFF or not _head_exists():
+        debug("Skipping recent commits")
+        return ""
+    return get_recent_commits(n)
 
 
 # ----------------------
 # Prompt builder
 # ----------------------
-def build_prompt(diff: str, recent_commits: str) -> str:
-    """Build the prompt to send to Claude API."""
-    return dedent(
-        f"""
+# Dedented once at import time; build_prompt only fills in the placeholders.
+PROMPT_TEMPLATE = dedent(
+    """
     Generate a git commit message following this structure:
     1. First line: conventional commit format (type: concise description)
        (use types like feat, fix, docs, style, refactor, perf, test, chore, etc.)
@@ -103,19 +166,95 @@ def build_prompt(diff: str, recent_commits: str) -> str:
     Here's the current diff:
     {diff}
     """
+)
+
+
+def _is_low_priority(section: str) -> bool:
+    """Return True for diff sections of lockfiles and generated assets."""
+    header = section.split("\n", 1)[0]
+    path = header.rsplit(" b/", 1)[-1].lower()
+    return path.endswith(LOW_PRIORITY_SUFFIXES)
+
+
+def _is_new_file(section: str) -> bool:
+    """Return True for the diff section of a newly added file."""
+    lines = section.split("\n", 2)
+    return len(lines) > 1 and lines[1].startswith("new file mode")
+
+
+def truncate_diff(
+    diff: str, limit: int = MAX_DIFF_CHARS, file_limit: int = MAX_FILE_CHARS
+) -> str:
+    """Cap the diff at `limit` characters, keeping source files first.
+
+    A diff within `limit` is returned untouched. Otherwise it is split into
+    per-file sections, newly added files are cut to `file_limit` each, and
+    lockfiles and generated assets are moved to the end so they are the
+    first to be dropped.
+    """
+    if len(diff) <= limit:
+        return diff
+    sections = []
+    for section in re.split(r"(?m)^(?=diff --git )", diff):
+        if len(section) > file_limit and _is_new_file(section):
+            dropped = len(section) - file_limit
+            section = f"{section[:file_limit]}\n... [truncated {dropped} characters]\n"
+        sections.append(section)
+    total = sum(len(section) for section in sections)
+    if total <= limit:
+        return "".join(sections)
+    kept = []
+    used = 0
+    for section in sorted(sections, key=_is_low_priority):
+        room = limit - used
+        if room <= 0:
+            break
+        kept.append(section[:room])
+        used += min(len(section), room)
+    kept.append(f"\n... [diff truncated, {total - used} characters omitted]\n")
+    return "".join(kept)
+
+
+def build_prompt(diff: str, recent_commits: str) -> str:
+    """Build the prompt to send to Claude API."""
+    return PROMPT_TEMPLATE.format(
+        recent_commits=recent_commits, diff=truncate_diff(diff)
     )
 
 
 # ----------------------
 # Anthropic helpers
 # ----------------------
+def _get_requests():
+    """Import requests on first use; return the module, or None if missing."""
+    global requests
+    if requests is None:
+        try:
+            import requests as _requests
+        except ImportError:
+            return None
+        requests = _requests
+    return requests
+
+
+def get_session() -> "requests.Session":
+    """Return a shared session so the models and messages calls reuse one
+    pooled HTTPS connection instead of doing a TLS handshake each."""
+    global _SESSION
+    if _SESSION is None:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        _SESSION = requests.Session()
+        _SESSION.mount("https://", adapter)
+    return _SESSION
+
+
 def get_models_from_api(api_key: str) -> List[Dict[str, Any]]:
     """Fetch available models for this key. Returns list of model dicts or []"""
-    if requests is None:
+    if _get_requests() is None:
         debug("requests not installed; cannot query model list")
         return []
     try:
-        resp = requests.get(
+        resp = get_session().get(
             "https://api.anthropic.com/v1/models",
             headers={"x-api-key": api_key, "anthropic-version": "2023-06-01"},
             timeout=10,
@@ -123,29 +262,86 @@ def get_models_from_api(api_key: str) -> List[Dict[str, Any]]:
         if resp.status_code != 200:
             debug(f"/v1/models returned {resp.status_code}: {resp.text}")
             return []
-        payload = resp.json()
+        payload = json_loads(resp.content)
         return payload.get("models") or payload.get("data") or []
     except Exception as e:
         debug(f"Error fetching models: {e}")
         return []
 
 
+def _models_cache_path(api_key: str) -> str:
+    """Return the cache file for this key's model list (keyed by key hash)."""
+    cache_dir = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, "gencommit", f"models-{key_hash}.json")
+
+
+def _load_cached_models(api_key: str) -> Optional[List[Dict[str, Any]]]:
+    """Return the cached model list if it exists and is fresh, else None."""
+    path = _models_cache_path(api_key)
+    try:
+        if time.time() - os.path.getmtime(path) > MODELS_CACHE_TTL:
+            debug("Model cache expired")
+            return None
+        with open(path, "rb") as f:
+            models = json_loads(f.read())
+    except (OSError, ValueError) as e:
+        debug(f"Model cache miss: {e}")
+        return None
+    return models if isinstance(models, list) else None
+
+
+def _save_cached_models(api_key: str, models: List[Dict[str, Any]]) -> None:
+    """Atomically write the model list to the cache (best effort)."""
+    path = _models_cache_path(api_key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(path), delete=False, encoding="utf-8"
+        ) as tmp:
+            json.dump(models, tmp)
+        os.replace(tmp.name, path)
+    except OSError as e:
+        debug(f"Could not write model cache: {e}")
+
+
+def get_models(api_key: str, refresh: bool = False) -> List[Dict[str, Any]]:
+    """Return the model list, served from the on-disk cache when fresh."""
+    if not refresh:
+        models = _load_cached_models(api_key)
+        if models is not None:
+            debug("Using cached model list")
+            return models
+    models = get_models_from_api(api_key)
+    if models:
+        _save_cached_models(api_key, models)
+    return models
+
+
 def pick_preferred_model(models: List[Dict[str, Any]]) -> Optional[str]:
     """Pick a preferred model string from models list (sonnet->opus->haiku)."""
-    names = [m.get("id") or m.get("name") or m.get("model") or str(m) for m in models]
-    for pref in ("sonnet", "opus", "haiku"):
-        for n in names:
-            if pref in n.lower() and "claude" in n.lower():
-                return n
-    for n in names:
-        if "claude" in n.lower():
-            return n
-    return None
+    best, best_rank = None, len(MODEL_PREFERENCE) + 1
+    for m in models:
+        name = m.get("id") or m.get("name") or m.get("model") or str(m)
+        lowered = name.lower()
+        if "claude" not in lowered:
+            continue
+        rank = next(
+            (i for i, pref in enumerate(MODEL_PREFERENCE) if pref in lowered),
+            len(MODEL_PREFERENCE),
+        )
+        if rank < best_rank:
+            best, best_rank = name, rank
+            if rank == 0:
+                break
+    return best
 
 
 def call_claude_api(prompt: str, api_key: str, model: str, timeout: int = 30) -> str:
-    """Send prompt to Anthropic Claude API using chosen model."""
-    if requests is None:
+    """Stream prompt to Anthropic Claude API, echoing text as it arrives."""
+    if _get_requests() is None:
         sys.exit(
             "The 'requests' library is required. Install it with: pip install requests"
         )
@@ -159,17 +355,36 @@ def call_claude_api(prompt: str, api_key: str, model: str, timeout: int = 30) ->
     body = {
         "model": model,
         "max_tokens": 300,
+        "stream": True,
         "messages": [{"role": "user", "content": prompt}],
     }
 
     debug(f"Sending request to Claude API with model={model}...")
+    chunks = []
     try:
-        resp = requests.post(url, headers=headers, json=body, timeout=timeout)
-        if resp.status_code != 200:
-            print(f"API Error Response: {resp.text}", file=sys.stderr)
-        resp.raise_for_status()
-        data = resp.json()
-        return data["content"][0]["text"].strip()
+        with get_session().post(
+            url, headers=headers, json=body, stream=True, timeout=timeout
+        ) as resp:
+            if resp.status_code != 200:
+                print(f"API Error Response: {resp.text}", file=sys.stderr)
+            resp.raise_for_status()
+            # Server-sent events: only the "data:" lines carry JSON payloads.
+            for line in resp.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                event = json_loads(line[len(b"data:") :])
+                etype = event.get("type")
+                if etype == "content_block_delta":
+                    text = event.get("delta", {}).get("text", "")
+                    if text:
+                        print(text, end="", flush=True)
+                        chunks.append(text)
+                elif etype == "error":
+                    sys.exit(f"❌ API error: {event.get('error', {}).get('message')}")
+                elif etype == "message_stop":
+                    break
+        print()
+        return "".join(chunks).strip()
     except requests.exceptions.RequestException as e:
         sys.exit(f"❌ Network/API error: {e}")
     except Exception as e:
@@ -179,42 +394,76 @@ def call_claude_api(prompt: str, api_key: str, model: str, timeout: int = 30) ->
 # ----------------------
 # Mock for local testing
 # ----------------------
+_MOCK_RE = re.compile(
+    r"\+\+\+ b/|def |(?i:fix)|(?P<todo>(?i:todo))|(?P<print>print\()"
+)
+
+
+def _line_at(text: str, pos: int) -> str:
+    """Return the line of `text` (as str.splitlines sees it) holding `pos`."""
+    start = text.rfind("\n", 0, pos) + 1
+    end = text.find("\n", pos)
+    chunk = text[start : end if end != -1 else None]
+    offset = start
+    for line in chunk.splitlines(keepends=True):
+        if pos < offset + len(line):
+            return line
+        offset += len(line)
+    return chunk
+
+
+def _mock_summary(line: str) -> Optional[str]:
+    """Return the mock summary for a line, or None if it has no hint."""
+    line = line.strip()
+    if line.startswith("+++ b/"):
+        return f"feat: update {line[len('+++ b/') :]}"
+    if "def " in line and "(" in line:
+        return "feat: add/modify function"
+    if "fix" in line.lower():
+        return "fix: address bug found in diff"
+    return None
+
+
 def call_claude_api_mock(prompt: str, api_key: Optional[str] = None) -> str:
     """Offline mock for local testing without API key or Internet."""
     debug("Using MOCK API (no network call).")
-    lines = prompt.splitlines()
-    summary = "chore: update files"
-    for l in lines:
-        l_strip = l.strip()
-        if l_strip.startswith("+++ b/"):
-            fname = l_strip[len("+++ b/") :]
-            summary = f"feat: update {fname}"
-            break
-        if "def " in l_strip and "(" in l_strip:
-            summary = "feat: add/modify function"
-            break
-        if "fix" in l_strip.lower():
-            summary = "fix: address bug found in diff"
+    # One regex sweep finds candidate lines; the first line with a hint picks
+    # the summary (new file, then function, then fix within that line), and
+    # TODO and print( hits anywhere add bullets.
+    summary = None
+    has_todo = has_print = False
+    for match in _MOCK_RE.finditer(prompt):
+        kind = match.lastgroup
+        if kind == "todo":
+            has_todo = True
+        elif kind == "print":
+            has_print = True
+        elif summary is None:
+            summary = _mock_summary(_line_at(prompt, match.start()))
+        if summary and has_todo and has_print:
             break
     bullets = []
-    if "TODO" in prompt.upper():
+    if has_todo:
         bullets.append("- Add TODO items")
-    if "print(" in prompt:
+    if has_print:
         bullets.append("- Adjust debugging prints")
     if not bullets:
         bullets.append("- See diff for details")
-    return summary + "\n\n" + "\n".join(bullets)
+    return (summary or "chore: update files") + "\n\n" + "\n".join(bullets)
 
 
 # ----------------------
 # Message cleaner
 # ----------------------
+# Surrounding whitespace/quotes, plus an optional ```lang ... ``` fence.
+_CLEAN_RE = re.compile(
+    r"^[\s\"']*(?:```[\w+-]*[ \t]*\n|```)?(.*?)(?:\n?```)?[\s\"']*$", re.DOTALL
+)
+
+
 def clean_commit_message(msg: str) -> str:
-    """Clean up model output (remove markdown formatting and extra quotes)."""
-    msg = msg.strip()
-    msg = msg.replace("```", "")
-    msg = msg.strip('"').strip("'").strip()
-    return msg
+    """Clean up model output (remove a wrapping code fence and extra quotes)."""
+    return _CLEAN_RE.match(msg).group(1)
 
 
 # ----------------------
@@ -223,22 +472,29 @@ def clean_commit_message(msg: str) -> str:
 def open_editor(initial_message: str) -> str:
     """Open a text editor for the user to edit commit message."""
     editor = os.getenv("EDITOR", "vim")
+    # Prefer the per-user runtime dir (tmpfs on most Linux systems).
+    tmp_dir = os.getenv("XDG_RUNTIME_DIR") or None
     with tempfile.NamedTemporaryFile(
-        suffix=".txt", delete=False, mode="w+", encoding="utf-8"
+        suffix=".txt", delete=False, mode="w", encoding="utf-8", dir=tmp_dir
     ) as tmp:
         tmp.write(initial_message)
-        tmp.flush()
+    # The file is closed before the editor runs (required on Windows) and
+    # read back by path, since editors may replace it rather than rewrite it.
+    try:
         try:
             subprocess.run([editor, tmp.name])
         except FileNotFoundError:
             print(f"Editor '{editor}' not found — using original message.")
-        tmp.seek(0)
-        edited = tmp.read()
-    try:
-        os.unlink(tmp.name)
-    except Exception:
-        pass
-    return edited
+        try:
+            return Path(tmp.name).read_text(encoding="utf-8")
+        except OSError:
+            print("Edited message file is missing — using original message.")
+            return initial_message
+    finally:
+        try:
+            os.unlink(tmp.name)
+        except OSError:
+            pass
 
 
 def commit_changes(message: str, dry_run: bool = False) -> None:
@@ -258,6 +514,8 @@ def commit_changes(message: str, dry_run: bool = False) -> None:
 # Main
 # ----------------------
 def main() -> None:
+    import argparse
+
     global DEBUG
     parser = argparse.ArgumentParser(
         description="Generate Git commit messages using Claude (Anthropic)."
@@ -269,49 +527,68 @@ def main() -> None:
     parser.add_argument(
         "--model", type=str, default=None, help="Anthropic model id to use"
     )
+    parser.add_argument(
+        "--refresh-models",
+        action="store_true",
+        help="Ignore the cached model list and fetch it again",
+    )
     parser.add_argument("--dry-run", action="store_true", help="Don't actually commit")
-    parser.add_argument("--version", action="store_true", help="Show version and exit")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=f"gencommit {VERSION}",
+        help="Show version and exit",
+    )
     args = parser.parse_args()
 
     DEBUG = args.debug
     use_mock = args.mock or os.getenv("GENCOMMIT_MOCK") == "1"
 
-    if args.version:
-        print(f"gencommit {VERSION}")
-        sys.exit(0)
-
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not use_mock and not api_key:
         sys.exit("❌ Error: ANTHROPIC_API_KEY not set. Use --mock for offline testing.")
 
     diff = get_staged_diff()
-    new_files = get_new_staged_files()
-
-    if not diff.strip() and not new_files:
+    if not diff.strip():
         sys.exit("❌ No staged changes found. Use 'git add' first.")
 
-    if new_files:
-        diff = append_new_files_to_diff(diff, new_files)
-
-    recent_commits = get_recent_commits(3)
-    prompt = build_prompt(diff, recent_commits)
+    # The model list is only needed right before the API call, so fetch it
+    # in the background while the prompt is assembled. It starts only once
+    # there is something to commit, so early exits never wait on it.
+    models_future = None
+    if not use_mock and not args.model:
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        models_future = executor.submit(get_models, api_key, args.refresh_models)
+        executor.shutdown(wait=False)
+
+    if use_mock:
+        # The mock only scans the diff itself, so skip fetching recent
+        # commits and building the full prompt.
+        prompt = diff.decode("utf-8", errors="replace")
+    else:
+        recent_commits = get_recent_context(diff, 3)
+        prompt = build_prompt(diff.decode("utf-8", errors="replace"), recent_commits)
 
     chosen_model = args.model
-    if not use_mock and not chosen_model:
-        models = get_models_from_api(api_key)
+    if models_future is not None:
+        models = models_future.result()
         chosen_model = pick_preferred_model(models) or "claude-sonnet-4-5"
         debug(f"Using model: {chosen_model}")
 
-    raw_message = (
-        call_claude_api_mock(prompt, api_key)
-        if use_mock
-        else call_claude_api(prompt, api_key, chosen_model)
-    )
-
-    commit_message = clean_commit_message(raw_message)
-
     print("\nSuggested commit message:\n" + "-" * 40)
-    print(commit_message)
+    if use_mock:
+        commit_message = clean_commit_message(call_claude_api_mock(prompt, api_key))
+        print(commit_message)
+    else:
+        # The streamed text is shown as it arrives; if cleaning changed it,
+        # show the exact message that will be committed as well.
+        raw_message = call_claude_api(prompt, api_key, chosen_model)
+        commit_message = clean_commit_message(raw_message)
+        if commit_message != raw_message:
+            print("-" * 40 + "\nMessage to be committed:\n" + "-" * 40)
+            print(commit_message)
     print("-" * 40)
 
     while True:
@@ -5,6 +5,7 @@ setup(
     version="1.0.0",
     py_modules=["gencommit"],
     install_requires=["requests"],
+    extras_require={"fast": ["orjson"]},
     entry_points={
         "console_scripts": [
             "gencommit=gencommit:main",